@@ -8,21 +8,30 @@ CREATE TABLE redroomsimdb.user_login_logs (
     ip_address VARCHAR(45)
 );
 
+-- One compacted row per completed attempt; step rows are folded into timeline
  CREATE TABLE redroomsimdb.simulation_analytics (
      id SERIAL PRIMARY KEY,
+     sim_uuid UUID UNIQUE, -- attempt this timeline was compacted from
      uid TEXT NOT NULL,
      scenario_id TEXT NOT NULL,
      score INTEGER,
      timeline JSONB,
      started_at TIMESTAMP,
      ended_at TIMESTAMP,
-     created_at TIMESTAMP DEFAULT now()
+     created_at TIMESTAMP DEFAULT now(),
+     updated_at TIMESTAMP DEFAULT now() -- bumped on re-compaction; export watermark
 );
 
+-- Existing databases predate the compaction link
+ALTER TABLE redroomsimdb.simulation_analytics ADD COLUMN IF NOT EXISTS sim_uuid UUID UNIQUE;
+ALTER TABLE redroomsimdb.simulation_analytics ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now();
+CREATE INDEX IF NOT EXISTS simulation_analytics_updated_at_idx ON redroomsimdb.simulation_analytics (updated_at);
+
 CREATE TABLE redroomsimdb.simulation_progress (
     id SERIAL PRIMARY KEY,
     sim_uuid UUID NOT NULL UNIQUE,
     scenario_id TEXT NOT NULL,
+    scenario_version TEXT, -- content hash of the scenario version played
     name TEXT NOT NULL,
     username TEXT NOT NULL,
     score INTEGER,
@@ -31,6 +40,9 @@ CREATE TABLE redroomsimdb.simulation_progress (
     -- allow multiple attempts per user and scenario
 );
 
+-- Existing databases predate scenario versioning
+ALTER TABLE redroomsimdb.simulation_progress ADD COLUMN IF NOT EXISTS scenario_version TEXT;
+
 CREATE TABLE redroomsimdb.simulation_step_progress (
     id SERIAL PRIMARY KEY,
     sim_uuid UUID NOT NULL REFERENCES redroomsimdb.simulation_progress(sim_uuid),
@@ -51,3 +63,81 @@ CREATE TABLE redroomsimdb.audit_logs (
     screen TEXT, -- UI screen or page initiating the event
     timestamp TIMESTAMPTZ DEFAULT now() -- time of the event
 );
+CREATE INDEX IF NOT EXISTS audit_logs_timestamp_idx ON redroomsimdb.audit_logs (timestamp);
+
+-- Change feed for the admin monitoring stream (/monitor/stream and
+-- /monitor/events). Triggers on the source tables append a row here and NOTIFY
+-- listeners with its channel. Clients resume from "<xid>-<id>": ids are taken
+-- before commit, so the API only hands out rows whose writing transaction is
+-- older than every open one, in (xid, id) order. Events older than a day are
+-- pruned by the trigger itself, so retention doesn't depend on a listener.
+CREATE TABLE redroomsimdb.monitor_events (
+    id BIGSERIAL PRIMARY KEY,
+    xid BIGINT NOT NULL DEFAULT 0, -- writing transaction; orders the resume cursor
+    channel TEXT NOT NULL, -- audit, login or progress
+    payload JSONB NOT NULL, -- row snapshot sent to clients
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+ALTER TABLE redroomsimdb.monitor_events ADD COLUMN IF NOT EXISTS xid BIGINT NOT NULL DEFAULT 0;
+CREATE INDEX monitor_events_created_at_idx ON redroomsimdb.monitor_events (created_at);
+CREATE INDEX IF NOT EXISTS monitor_events_xid_id_idx ON redroomsimdb.monitor_events (xid, id);
+
+CREATE OR REPLACE FUNCTION redroomsimdb.publish_monitor_event() RETURNS trigger AS $$
+DECLARE
+    event_channel TEXT := TG_ARGV[0];
+    event_payload JSONB;
+    event_id BIGINT;
+BEGIN
+    IF event_channel = 'audit' THEN
+        event_payload := jsonb_build_object(
+            'actor', NEW.actor, 'action', NEW.action, 'details', NEW.details,
+            'screen', NEW.screen, 'timestamp', NEW.timestamp);
+    ELSIF event_channel = 'login' THEN
+        event_payload := jsonb_build_object(
+            'email', NEW.email, 'role', NEW.role, 'event', NEW.event,
+            'timestamp', NEW.timestamp);
+    ELSE
+        event_payload := jsonb_build_object(
+            'op', lower(TG_OP), 'sim_uuid', NEW.sim_uuid, 'scenario_id', NEW.scenario_id,
+            'name', NEW.name, 'username', NEW.username, 'score', NEW.score,
+            'completed', NEW.completed, 'created_at', NEW.created_at);
+    END IF;
+
+    INSERT INTO redroomsimdb.monitor_events (xid, channel, payload)
+    VALUES (pg_current_xact_id()::text::bigint, event_channel, event_payload)
+    RETURNING id INTO event_id;
+    PERFORM pg_notify('monitor_events', event_channel);
+
+    -- sweep the resume window every 1000 events instead of on every write
+    IF event_id % 1000 = 0 THEN
+        DELETE FROM redroomsimdb.monitor_events WHERE created_at < now() - interval '1 day';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER audit_logs_monitor AFTER INSERT ON redroomsimdb.audit_logs
+    FOR EACH ROW EXECUTE FUNCTION redroomsimdb.publish_monitor_event('audit');
+CREATE TRIGGER user_login_logs_monitor AFTER INSERT ON redroomsimdb.user_login_logs
+    FOR EACH ROW EXECUTE FUNCTION redroomsimdb.publish_monitor_event('login');
+CREATE TRIGGER simulation_progress_monitor AFTER INSERT OR UPDATE ON redroomsimdb.simulation_progress
+    FOR EACH ROW EXECUTE FUNCTION redroomsimdb.publish_monitor_event('progress');
+
+-- Per-step decision counters for scenario tuning, maintained by /progress/step
+CREATE TABLE redroomsimdb.scenario_step_stats (
+    scenario_id TEXT NOT NULL,
+    step_index INTEGER NOT NULL,
+    decision TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0, -- times this decision was made
+    total_time_ms BIGINT NOT NULL DEFAULT 0, -- summed time spent before deciding
+    PRIMARY KEY (scenario_id, step_index, decision)
+);
+
+-- Time-per-step histogram; bucket indexes map to TIME_BUCKETS_MS in services/step_stats.py
+CREATE TABLE redroomsimdb.scenario_step_time_histogram (
+    scenario_id TEXT NOT NULL,
+    step_index INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (scenario_id, step_index, bucket)
+);
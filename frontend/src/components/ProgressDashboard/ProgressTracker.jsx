@@ -100,19 +100,8 @@ const ProgressTracker = () => {
 
         if (Array.isArray(res.data?.scenarios)) {
           for (const s of res.data.scenarios) {
-            try {
-              const detail = await axios.get(
-                `https://api.redroomsim.com/sim/${s.id}`
-              );
-              map[s.id] = {
-                name: s.name,
-                steps: Array.isArray(detail.data?.steps)
-                  ? detail.data.steps.length
-                  : 0,
-              };
-            } catch (err) {
-              map[s.id] = { name: s.name, steps: 0 };
-            }
+            // step counts come with the listing, no need to fetch every scenario
+            map[s.id] = { name: s.name, steps: s.step_count || 0 };
           }
         }
 
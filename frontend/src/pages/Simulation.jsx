@@ -15,22 +15,33 @@ Changelog:
  - Added routing for different simulation scenarios.
  - Improved UI/UX for better user interaction.
  - Dark mode support added
+ - Load the scenario manifest and fetch steps on demand with prefetch
 */
 
-import React, { useState, useEffect, useRef } from "react";
+import React, { useState, useEffect, useRef, useCallback } from "react";
 import { useParams, useSearchParams, useNavigate } from "react-router-dom";
 import axios from "axios";
 import ScoringBar from "../components/SimulationEngine/ScoringBar";
 import TimelineViewer from "../components/SimulationEngine/TimelineViewer";
 import { useAuth } from "../context/AuthContext";
 
+// collect a step payload (and its prefetched steps) into an index -> step map
+const collectSteps = (payload, map) => {
+  const loaded = { [payload.index]: payload.step };
+  (payload.prefetch || []).forEach((s) => {
+    loaded[map[s.id]] = s; // cache reachable steps so Next is instant
+  });
+  return loaded;
+};
+
 const Simulation = () => {
   const { scenarioId } = useParams();
   const [searchParams] = useSearchParams();
   const navigate = useNavigate();
   const initialStep = parseInt(searchParams.get("step")) || 0;
   const initialSimId = searchParams.get("simId");
-  const [scenario, setScenario] = useState(null);
+  const [scenario, setScenario] = useState(null); // manifest: metadata and step outline
+  const [steps, setSteps] = useState({}); // step bodies loaded so far, keyed by index
   const [currentStepIndex, setCurrentStepIndex] = useState(initialStep);
   const [selectedOption, setSelectedOption] = useState(null);
   const [feedback, setFeedback] = useState("");
@@ -50,17 +61,35 @@ const Simulation = () => {
   const [mitreScores, setMitreScores] = useState({}); // cumulative MITRE ATT&CK counts
   const { user } = useAuth();
   const initProgressRef = useRef(false); // guard against duplicate progress entries
+  const resumeEmail = initialSimId ? user?.email : null; // only a resumed attempt waits on the user
 
   useEffect(() => {
+    // a resumed attempt replays the version it is pinned to, looked up by user
+    if (initialSimId && !resumeEmail) return;
     const fetchScenario = async () => {
       try {
-        const response = await axios.get(`https://api.redroomsim.com/sim/${scenarioId}`);
+        let ref = scenarioId;
+        if (initialSimId) {
+          try {
+            const progress = await axios.get(
+              `https://api.redroomsim.com/progress/detail/${resumeEmail}/${initialSimId}`
+            );
+            if (progress.data.scenario_version) {
+              ref = `${scenarioId}@${progress.data.scenario_version}`; // replay the version it started on
+            }
+          } catch (error) {
+            console.error("Failed to load progress record", error);
+          }
+        }
+        const response = await axios.get(`https://api.redroomsim.com/sim/${ref}/manifest`);
         setScenario(response.data);
         const map = {}; // build a map of step id to index for quick lookup
-        response.data.steps.forEach((s, idx) => {
-          map[s.id] = idx; // store mapping for branch navigation
+        response.data.steps.forEach((s) => {
+          map[s.id] = s.index; // store mapping for branch navigation
         });
         setStepMap(map); // save map in state
+        // the manifest inlines the first step so it renders without another request
+        setSteps(response.data.first_step ? collectSteps(response.data.first_step, map) : {});
         const now = Date.now();
         setAnalytics((prev) => ({ ...prev, startTime: now }));
         setStartTime(now); // track when the scenario was first loaded
@@ -69,7 +98,26 @@ const Simulation = () => {
       }
     };
     fetchScenario();
-  }, [scenarioId]);
+  }, [scenarioId, initialSimId, resumeEmail]);
+
+  // fetch one step (plus the steps reachable from it) from the manifest's version
+  const loadStep = useCallback(async (index) => {
+    if (!scenario || steps[index] || index >= scenario.step_count) return;
+    const ref = scenario.version ? `${scenarioId}@${scenario.version}` : scenarioId;
+    try {
+      const response = await axios.get(
+        `https://api.redroomsim.com/sim/${ref}/steps/${scenario.steps[index].id}`,
+        { params: { prefetch: true } }
+      );
+      setSteps((prev) => ({ ...collectSteps(response.data, stepMap), ...prev }));
+    } catch (error) {
+      console.error("Failed to load step", error);
+    }
+  }, [scenario, steps, scenarioId, stepMap]);
+
+  useEffect(() => {
+    loadStep(currentStepIndex);
+  }, [loadStep, currentStepIndex]);
 
   // initialize progress record when scenario and user are available
   useEffect(() => {
@@ -79,6 +127,7 @@ const Simulation = () => {
       try {
         const response = await axios.post("https://api.redroomsim.com/progress/save", {
           scenario_id: scenarioId,
+          scenario_version: scenario.version, // pin the attempt to the version being played
           name: scenario.name,
           username: user.email,
           score: 0,
@@ -100,7 +149,7 @@ const Simulation = () => {
   const handleOptionSelect = (index) => {
     if (selectedOption !== null) return;
 
-    const step = scenario.steps[currentStepIndex];
+    const step = steps[currentStepIndex];
     const optionObj = step.options[index]; // may be string or object
     const optionText = optionObj.text || optionObj; // normalize to text
     const correct = step.correct_option;
@@ -182,9 +231,9 @@ const Simulation = () => {
       setRetry(false); // user opted to retry current step
       return;
     }
-    if (nextStep !== null && nextStep < scenario.steps.length) {
+    if (nextStep !== null && nextStep < scenario.step_count) {
       setCurrentStepIndex(nextStep); // jump to branched step
-    } else if (currentStepIndex + 1 < scenario.steps.length) {
+    } else if (currentStepIndex + 1 < scenario.step_count) {
       setCurrentStepIndex((prev) => prev + 1); // proceed sequentially
     } else {
       setCompleted(true); // simulation finished
@@ -251,8 +300,9 @@ const Simulation = () => {
 
   if (!scenario) return <div className="p-6">Loading scenario...</div>;
 
-  const step = scenario.steps[currentStepIndex];
-  const scorePercent = Math.round((score / scenario.steps.length) * 100);
+  const step = steps[currentStepIndex];
+  if (!step && !completed) return <div className="p-6">Loading step...</div>;
+  const scorePercent = Math.round((score / scenario.step_count) * 100);
   const totalDurationSec = analytics.endTime
     ? Math.round((analytics.endTime - analytics.startTime) / 1000)
     : null;
@@ -268,7 +318,7 @@ const Simulation = () => {
                 <p className="text-xl">
                   {endedEarly ? "Simulation Ended" : "🎉 Simulation Complete!"}
                 </p>
-                {/*<p className="text-lg">Score: {score} / {scenario.steps.length}</p>*/}
+                {/*<p className="text-lg">Score: {score} / {scenario.step_count}</p>*/}
                 <p className="text-md text-gray-600 dark:text-gray-300">
                   Duration: {totalDurationSec} seconds
                 </p>
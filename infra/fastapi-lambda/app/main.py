@@ -4,7 +4,13 @@ from routes.sim_router import sim_router
 from routes.logging_router import router as logging_router
 from routes.progress_router import progress_router
 from routes.audit_router import router as audit_router
+from routes.profiler_router import router as profiler_router
+from routes.admission_router import router as admission_router
+from routes.monitor_router import router as monitor_router
+from services.admission import admission_middleware
 from services.audit_service import record_audit_event
+from services.compression import CompressionMiddleware
+from services.profiler import profile_middleware
 from mangum import Mangum
 
 app = FastAPI()
@@ -14,14 +20,8 @@ origins = [
     "https://www.redroomsim.com",
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_origin_regex=r"https://(.+\.)?redroomsim\.com",
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
+# Negotiated brotli/gzip compression for anything larger than ~1KB
+app.add_middleware(CompressionMiddleware, minimum_size=1000)
 
 
 @app.middleware("http")
@@ -38,9 +38,29 @@ async def audit_middleware(request: Request, call_next):
         pass
     return response
 
+# Registered after the audit middleware so profiles include audit logging time
+app.middleware("http")(profile_middleware)
+
+# Shed requests never reach the audit table or the DB pool
+app.middleware("http")(admission_middleware)
+
+# Outermost, so 429/503 rejections still carry CORS headers
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_origin_regex=r"https://(.+\.)?redroomsim\.com",
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Scenario-Version", "Retry-After"],
+)
+
 app.include_router(sim_router, prefix="/sim")
 app.include_router(logging_router, prefix="/logs")
 app.include_router(progress_router, prefix="/progress")
 app.include_router(audit_router, prefix="/audit")
+app.include_router(profiler_router, prefix="/profiles")
+app.include_router(admission_router, prefix="/admission")
+app.include_router(monitor_router, prefix="/monitor")
 
 handler = Mangum(app)
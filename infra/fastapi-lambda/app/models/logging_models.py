@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, func
+from sqlalchemy.dialects.postgresql import JSONB
 from db import Base
 
 class UserLoginLog(Base):
@@ -23,4 +24,16 @@ class AuditLog(Base):
     action = Column(String, nullable=False)  # short description
     details = Column(String)  # any extra details
     screen = Column(String)  # originating UI screen or page
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class MonitorEvent(Base):
+    """Change-feed entry written by database triggers for the monitoring stream."""
+
+    __tablename__ = "monitor_events"
+    __table_args__ = {"schema": "redroomsimdb"}
+    id = Column(BigInteger, primary_key=True)
+    xid = Column(BigInteger, nullable=False, server_default="0")  # writing transaction; (xid, id) is the resume cursor
+    channel = Column(String, nullable=False)  # audit, login or progress
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # pruned after a day
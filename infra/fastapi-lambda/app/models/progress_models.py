@@ -1,12 +1,14 @@
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     Boolean,
     DateTime,
     func,
     ForeignKey,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from db import Base
 
 
@@ -17,6 +19,7 @@ class SimulationProgress(Base):
     id = Column(Integer, primary_key=True, index=True)
     sim_uuid = Column(String, unique=True, nullable=False)
     scenario_id = Column(String, nullable=False)
+    scenario_version = Column(String)  # content hash of the scenario played
     name = Column(String, nullable=False)
     username = Column(String, nullable=False)
     score = Column(Integer)
@@ -41,3 +44,47 @@ class SimulationStepProgress(Base):
     time_ms = Column(Integer)
     sequence = Column(Integer, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SimulationAnalytics(Base):
+    """Compacted, read-only timeline for a finished simulation attempt."""
+
+    __tablename__ = "simulation_analytics"
+    __table_args__ = {"schema": "redroomsimdb"}
+
+    id = Column(Integer, primary_key=True, index=True)
+    sim_uuid = Column(String, unique=True, index=True)
+    uid = Column(String, nullable=False)  # username of the trainee
+    scenario_id = Column(String, nullable=False)
+    score = Column(Integer)
+    timeline = Column(JSONB)  # {"steps": [...], "totals": {...}}
+    started_at = Column(DateTime)
+    ended_at = Column(DateTime)
+    created_at = Column(DateTime, server_default=func.now())
+    # bumped on every re-compaction so exports can pick the row up again
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
+
+
+class ScenarioStepStat(Base):
+    """Running count and time total per (scenario, step, decision)."""
+
+    __tablename__ = "scenario_step_stats"
+    __table_args__ = {"schema": "redroomsimdb"}
+
+    scenario_id = Column(String, primary_key=True)
+    step_index = Column(Integer, primary_key=True)
+    decision = Column(String, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+    total_time_ms = Column(BigInteger, nullable=False, default=0)
+
+
+class ScenarioStepTimeBucket(Base):
+    """Time-per-step histogram bucket; see ``services.step_stats.TIME_BUCKETS_MS``."""
+
+    __tablename__ = "scenario_step_time_histogram"
+    __table_args__ = {"schema": "redroomsimdb"}
+
+    scenario_id = Column(String, primary_key=True)
+    step_index = Column(Integer, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from services.admission import get_admission_stats
+
+router = APIRouter()
+
+
+@router.get("/stats")
+def admission_stats():
+    """Return load-shedding counters for guarded routes."""
+    return get_admission_stats()
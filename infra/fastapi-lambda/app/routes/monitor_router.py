@@ -0,0 +1,125 @@
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
+import logging
+
+from services.monitor_feed import (
+    CHANNELS,
+    fetch_events,
+    format_cursor,
+    latest_cursor,
+    notifier,
+    parse_cursor,
+)
+
+router = APIRouter()
+
+POLL_INTERVAL = 15  # seconds between re-checks and keep-alive comments
+LONG_POLL_INTERVAL = 1  # seconds between reads while a long poll waits
+LONG_POLL_MAX_WAIT = 20  # stays under API Gateway's 30 s integration timeout
+
+
+def _channels(channels: str) -> tuple[str, ...]:
+    selected = tuple(c for c in channels.split(",") if c in CHANNELS)
+    if not selected:
+        raise HTTPException(status_code=400, detail=f"channels must be from {', '.join(CHANNELS)}")
+    return selected
+
+
+async def _start_position(cursor: str | None) -> tuple[int, int]:
+    if cursor is None:
+        return await run_in_threadpool(latest_cursor)
+    position = parse_cursor(cursor)
+    if position is None:
+        raise HTTPException(status_code=400, detail="cursor must look like <xid>-<id>")
+    return position
+
+
+@router.get("/events")
+async def monitor_events(
+    channels: str = ",".join(CHANNELS),
+    cursor: str | None = None,
+    wait: int = 0,
+):
+    """Return events after ``cursor``, waiting up to ``wait`` seconds for new ones.
+
+    A long-poll alternative to ``/stream`` that works behind API Gateway and
+    Lambda. Pass the returned ``cursor`` to the next call; without one, only
+    events created after the first call are returned.
+    """
+    selected = _channels(channels)
+    position = await _start_position(cursor)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(max(wait, 0), LONG_POLL_MAX_WAIT)
+    while True:
+        events = await run_in_threadpool(fetch_events, position, selected)
+        if events or loop.time() >= deadline:
+            break
+        await asyncio.sleep(LONG_POLL_INTERVAL)
+
+    return {
+        "cursor": events[-1]["cursor"] if events else format_cursor(position),
+        "events": [
+            {"cursor": e["cursor"], "channel": e["channel"], "payload": e["payload"]}
+            for e in events
+        ],
+    }
+
+
+@router.get("/stream")
+async def monitor_stream(
+    request: Request,
+    channels: str = ",".join(CHANNELS),
+    cursor: str | None = None,
+    last_event_id: str | None = Header(default=None),
+):
+    """Stream new audit, login and progress events as server-sent events.
+
+    Clients resume from ``cursor`` or the ``Last-Event-ID`` header; without
+    either, only events created after connecting are sent.
+    """
+    if "aws.event" in request.scope:
+        # Mangum buffers the whole response, so a stream would hold the Lambda
+        # until it times out and deliver nothing
+        raise HTTPException(
+            status_code=501,
+            detail="Streaming is not available on this deployment; poll /monitor/events instead",
+        )
+    selected = _channels(channels)
+    position = await _start_position(cursor or last_event_id)
+
+    async def event_source():
+        nonlocal position
+        wakeup = notifier.subscribe(selected)
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                wakeup.clear()
+                try:
+                    events = await run_in_threadpool(fetch_events, position, selected)
+                except Exception:
+                    logging.exception("Error reading monitor events")
+                    events = []
+                for event in events:
+                    position = event["position"]
+                    yield (
+                        f"id: {event['cursor']}\n"
+                        f"event: {event['channel']}\n"
+                        f"data: {json.dumps(event['payload'], default=str)}\n\n"
+                    )
+                if events:
+                    continue  # drain any backlog before waiting again
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            notifier.unsubscribe(wakeup)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
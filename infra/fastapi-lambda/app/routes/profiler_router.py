@@ -0,0 +1,45 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from services import profiler
+
+router = APIRouter()
+
+
+def require_profiler_token(x_profile_token: str | None = Header(default=None)):
+    """Only admins holding the profiler token may read profiles."""
+    if not profiler.PROFILER_TOKEN or not hmac.compare_digest(
+        (x_profile_token or "").encode(), profiler.PROFILER_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/", dependencies=[Depends(require_profiler_token)])
+async def list_profiles(limit: int = 50):
+    """Return metadata for stored request profiles, newest first."""
+    return await run_in_threadpool(profiler.list_profiles, limit)
+
+
+@router.get("/{profile_id}", dependencies=[Depends(require_profiler_token)])
+def download_profile(profile_id: str, format: str = "speedscope"):
+    """Download a profile as speedscope JSON, collapsed stacks or raw JSON."""
+    document = profiler.load_profile(profile_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    if format == "collapsed":
+        return PlainTextResponse(
+            profiler.to_collapsed(document),
+            headers={"Content-Disposition": f"attachment; filename={profile_id}.collapsed.txt"},
+        )
+    if format == "speedscope":
+        return JSONResponse(
+            profiler.to_speedscope(document),
+            headers={"Content-Disposition": f"attachment; filename={profile_id}.speedscope.json"},
+        )
+    if format == "json":
+        return document
+    raise HTTPException(status_code=400, detail="format must be speedscope, collapsed or json")
@@ -4,7 +4,18 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import func
 from db import SessionLocal
 from datetime import datetime
-from models.progress_models import SimulationProgress, SimulationStepProgress
+from models.progress_models import (
+    SimulationAnalytics,
+    SimulationProgress,
+    SimulationStepProgress,
+)
+from services.timeline_service import (
+    compact_simulation,
+    compact_completed_simulations,
+    compacted_sequence,
+)
+from services.step_stats import get_step_stats, rebuild_step_stats, record_step
+from services.scenario_store import VERSION_RE, get_scenario_store
 from pydantic import BaseModel
 import uuid
 
@@ -13,6 +24,7 @@ progress_router = APIRouter()
 
 class ProgressIn(BaseModel):
     scenario_id: str
+    scenario_version: str | None = None
     name: str
     username: str
     score: int | None = None
@@ -28,6 +40,24 @@ class StepProgressIn(BaseModel):
     time_ms: int | None = None
 
 
+def _pin_version(scenario_id: str, version: str | None) -> str | None:
+    """Return the scenario version a new attempt is pinned to.
+
+    The client's version is kept only if it names a stored document of
+    ``scenario_id``; otherwise the attempt gets the version current now.
+    """
+    try:
+        store = get_scenario_store()
+        if version and VERSION_RE.match(version):
+            document = store.get_version(version)
+            if document is not None and document.get("scenario_id") == scenario_id:
+                return version
+        return store.resolve(scenario_id)[0]
+    except Exception:
+        logging.exception("Error resolving scenario version")
+        return None
+
+
 @progress_router.post("/save")
 def save_progress(progress: ProgressIn):
     db = SessionLocal()
@@ -44,6 +74,15 @@ def save_progress(progress: ProgressIn):
             record.completed = progress.completed
             db.commit()
             db.refresh(record)
+            if record.completed:
+                # fold finished attempts into a single timeline document
+                try:
+                    compact_simulation(db, record.sim_uuid)
+                    db.commit()
+                except SQLAlchemyError:
+                    # the background sweep will pick this attempt up again
+                    db.rollback()
+                    logging.exception("Error compacting simulation")
             return {"simulation_id": record.sim_uuid}
         else:
             # avoid creating duplicate progress entries for the same user and scenario
@@ -64,6 +103,7 @@ def save_progress(progress: ProgressIn):
             record = SimulationProgress(
                 sim_uuid=sim_uuid,
                 scenario_id=progress.scenario_id,
+                scenario_version=_pin_version(progress.scenario_id, progress.scenario_version),
                 name=progress.name,
                 username=progress.username,
                 score=progress.score,
@@ -90,8 +130,11 @@ def save_step_progress(step: StepProgressIn):
             .filter_by(sim_uuid=step.sim_uuid)
             .scalar()
         )
-        next_sequence = (last_sequence or 0) + 1
-        
+        if last_sequence is None:
+            # steps arriving after compaction continue the folded sequence
+            last_sequence = compacted_sequence(db, step.sim_uuid)
+        next_sequence = last_sequence + 1
+
         time_ms = step.time_ms
         # ensure we store a reasonable duration for this step
         if time_ms is None or time_ms > 2_000_000_000:
@@ -103,6 +146,12 @@ def save_step_progress(step: StepProgressIn):
                 .first()
             )
             base_time = last_record.created_at if last_record else None
+            if base_time is None:
+                base_time = (
+                    db.query(SimulationAnalytics.ended_at)
+                    .filter_by(sim_uuid=step.sim_uuid)
+                    .scalar()
+                )
             if base_time is None:
                 start_record = (
                     db.query(SimulationProgress)
@@ -125,8 +174,20 @@ def save_step_progress(step: StepProgressIn):
             sequence=next_sequence,
         )
         db.add(record)
+        progress = (
+            db.query(SimulationProgress.scenario_id, SimulationProgress.completed)
+            .filter_by(sim_uuid=step.sim_uuid)
+            .first()
+        )
+        # keep the per-step decision counters in the same transaction
+        if progress and progress.scenario_id:
+            record_step(db, progress.scenario_id, step.step_index, step.decision, time_ms)
+        if progress and progress.completed:
+            # a late step on a finished attempt is folded straight into its
+            # timeline rather than waiting in the hot table for a sweep
+            db.flush()
+            compact_simulation(db, step.sim_uuid)
         db.commit()
-        db.refresh(record)
         return {"status": "saved"}
     except SQLAlchemyError as e:
         db.rollback()
@@ -151,6 +212,7 @@ def get_progress(username: str, simulation_id: str):
         return {
             "name": record.name,
             "id": record.scenario_id,
+            "scenario_version": record.scenario_version,
             "score": record.score,
             "username": record.username,
             "completed": record.completed,
@@ -167,13 +229,31 @@ def get_progress(username: str, simulation_id: str):
 def get_timeline(simulation_id: str):
     db = SessionLocal()
     try:
+        # completed attempts are served from their compacted timeline
+        analytics = (
+            db.query(SimulationAnalytics)
+            .filter_by(sim_uuid=simulation_id)
+            .first()
+        )
+        compacted = [
+            {
+                "decision": s.get("decision"),
+                "feedback": s.get("feedback"),
+                "timeMs": s.get("timeMs"),
+                "step_index": s.get("step_index"),
+                "timestamp": s.get("timestamp"),
+            }
+            for s in (analytics.timeline or {}).get("steps", [])
+        ] if analytics else []
+
+        # plus any steps recorded since the attempt was last compacted
         records = (
             db.query(SimulationStepProgress)
             .filter_by(sim_uuid=simulation_id)
             .order_by(SimulationStepProgress.sequence)
             .all()
         )
-        return [
+        return compacted + [
             {
                 "decision": r.decision,
                 "feedback": r.feedback,
@@ -190,6 +270,43 @@ def get_timeline(simulation_id: str):
         db.close()
 
 
+@progress_router.post("/compact")
+def compact_progress(limit: int = 100):
+    """Catch-up sweep for completed attempts whose step rows were never folded.
+
+    Completion saves and late steps compact inline, so this only finds rows
+    left by attempts completed before compaction existed or by failed saves.
+    """
+    try:
+        return {"compacted": compact_completed_simulations(limit=limit)}
+    except SQLAlchemyError as e:
+        logging.exception("Error compacting progress")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@progress_router.get("/scenario/{scenario_id}/step-stats")
+def get_scenario_step_stats(scenario_id: str):
+    """Return how trainees answer each step of a scenario and how long they take."""
+    db = SessionLocal()
+    try:
+        return {"scenario_id": scenario_id, "steps": get_step_stats(db, scenario_id)}
+    except SQLAlchemyError as e:
+        logging.exception("Error retrieving step stats")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        db.close()
+
+
+@progress_router.post("/step-stats/rebuild")
+def rebuild_scenario_step_stats(scenario_id: str | None = None):
+    """Recompute step counters from stored steps, for one scenario or all."""
+    try:
+        return {"steps_counted": rebuild_step_stats(scenario_id)}
+    except SQLAlchemyError as e:
+        logging.exception("Error rebuilding step stats")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @progress_router.get("/user/{username}")
 def get_user_progress(username: str):
     db = SessionLocal()
@@ -204,6 +321,7 @@ def get_user_progress(username: str):
             {
                 "id": r.id,
                 "scenario_id": r.scenario_id,
+                "scenario_version": r.scenario_version,
                 "name": r.name,
                 "score": r.score,
                 "completed": r.completed,
@@ -232,6 +350,7 @@ def get_all_progress(username: str | None = None):
         return [
             {
                 "scenario_id": r.scenario_id,
+                "scenario_version": r.scenario_version,
                 "name": r.name,
                 "username": r.username,
                 "score": r.score,
@@ -1,25 +1,117 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Response
 import os
 import json
 import re
+import time
 from datetime import datetime
-import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 from models.simmodels import SimScenario
+from services.scenario_store import ScenarioStoreReadOnly, get_scenario_store
 
 
+# Current version of each scenario_id, so step requests don't rescan the store
+SCENARIO_CACHE_TTL = int(os.environ.get("SCENARIO_CACHE_TTL", "300"))
+_scenario_cache: dict[str, tuple[float, str | None, dict]] = {}
 
-SCENARIO_DIR = os.path.join(os.path.dirname(__file__), "../../../data")
-SCENARIO_DIR = os.path.abspath(SCENARIO_DIR)
+# Pinned versions never change, so they are cached without expiry
+VERSION_CACHE_SIZE = 256
+_version_cache: dict[str, dict] = {}
 
-BUCKET_NAME = "redroomsimbucket"
-s3_client = boto3.client("s3")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 sim_router = APIRouter()
 
 def normalize_name(name):
     return name.lower().replace("_", "-").replace(".json", "").strip()
 
+
+def _cache_scenario(version: str | None, data: dict) -> None:
+    scenario_id = data.get("scenario_id")
+    if scenario_id:
+        _scenario_cache[scenario_id] = (time.monotonic(), version, data)
+
+
+def _load_version(version: str) -> dict | None:
+    data = _version_cache.get(version)
+    if data is None:
+        data = get_scenario_store().get_version(version)
+        if data is not None:
+            if len(_version_cache) >= VERSION_CACHE_SIZE:
+                _version_cache.pop(next(iter(_version_cache)))
+            _version_cache[version] = data
+    return data
+
+
+def _load_scenario(scenario_ref: str) -> tuple[str | None, dict | None]:
+    """Resolve ``scenario_id`` or ``scenario_id@version`` to ``(version, document)``."""
+    scenario_id, _, version = scenario_ref.partition("@")
+    if version:
+        data = _load_version(version)
+        if data is None or data.get("scenario_id") != scenario_id:
+            return None, None
+        return version, data
+
+    cached = _scenario_cache.get(scenario_id)
+    if cached and time.monotonic() - cached[0] < SCENARIO_CACHE_TTL:
+        return cached[1], cached[2]
+
+    version, data = get_scenario_store().resolve(scenario_id)
+    if data is not None:
+        _cache_scenario(version, data)
+    return version, data
+
+
+def _scenario_or_404(scenario_ref: str, response: Response) -> tuple[str | None, dict]:
+    """Load a scenario for a route and set its version/caching headers."""
+    try:
+        version, data = _load_scenario(scenario_ref)
+    except (BotoCoreError, ClientError, Exception) as e:
+        raise HTTPException(status_code=500, detail=f"Error reading scenario: {str(e)}")
+    if data is None:
+        raise HTTPException(status_code=404, detail="Scenario ID not found in any JSON.")
+
+    if version:
+        response.headers["X-Scenario-Version"] = version
+        if "@" in scenario_ref:
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+            response.headers["ETag"] = f'"{version}"'
+    return version, data
+
+
+def _next_step_ids(steps: list[dict], index: int) -> list:
+    """Return ids of the other steps reachable from ``steps[index]``.
+
+    Follows the simulation page: an option's ``next_step`` wins when it names a
+    known step, an explicit ``null`` retries the same step, and anything else
+    continues with the next step in order.
+    """
+    known_ids = {step.get("id") for step in steps}
+    reachable = []
+    sequential = False
+    for option in steps[index].get("options", []):
+        if isinstance(option, dict) and "next_step" in option and option["next_step"] is None:
+            continue  # retry stays on the step the client already has
+        target = option.get("next_step") if isinstance(option, dict) else None
+        if target is not None and target in known_ids:
+            if target not in reachable:
+                reachable.append(target)
+        else:
+            sequential = True
+    if sequential and index + 1 < len(steps):
+        following = steps[index + 1].get("id")
+        if following not in reachable:
+            reachable.append(following)
+    return reachable
+
+def _step_payload(steps: list[dict], index: int, prefetch: bool) -> dict:
+    """Serialize ``steps[index]`` with the ids (and optionally bodies) reachable from it."""
+    next_ids = _next_step_ids(steps, index)
+    payload = {"index": index, "step": steps[index], "next_step_ids": next_ids}
+    if prefetch:
+        by_id = {step.get("id"): step for step in steps}
+        payload["prefetch"] = [by_id[next_id] for next_id in next_ids]
+    return payload
+
 @sim_router.get("/test")
 def test_connection():
     return {"message": "Router is active"}
@@ -29,38 +121,67 @@ def list_scenarios():
     scenario_list = []
 
     try:
-        response = s3_client.list_objects_v2(Bucket=BUCKET_NAME)
-        for obj in response.get("Contents", []):
-            key = obj["Key"]
-            if key.endswith(".json"):
-                file_obj = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
-                data = json.loads(file_obj["Body"].read().decode("utf-8"))
-                scenario_list.append({
-                    "id": data.get("scenario_id", key),
-                    "name": data.get("name", os.path.splitext(key)[0]),
-                    "description": data.get("description", "No description provided"),
-                    "type": data.get("type", "Default"),
-                    "difficulty": data.get("difficulty", "Easy")
-                })
+        for key, version, data in get_scenario_store().list_scenarios():
+            _cache_scenario(version, data)
+            scenario_list.append({
+                "id": data.get("scenario_id", key),
+                "name": data.get("name", os.path.splitext(key)[0]),
+                "description": data.get("description", "No description provided"),
+                "type": data.get("type", "Default"),
+                "difficulty": data.get("difficulty", "Easy"),
+                "step_count": len(data.get("steps", [])),
+                "version": version,
+            })
     except (BotoCoreError, ClientError, Exception) as e:
         raise HTTPException(status_code=500, detail=f"Failed to read scenarios: {str(e)}")
 
     return {"scenarios": scenario_list}
 
 @sim_router.get("/{scenario_id}")
-def get_scenario(scenario_id: str):
-    try:
-        response = s3_client.list_objects_v2(Bucket=BUCKET_NAME)
-        for obj in response.get("Contents", []):
-            key = obj["Key"]
-            if key.endswith(".json"):
-                file_obj = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
-                data = json.loads(file_obj["Body"].read().decode("utf-8"))
-                if data.get("scenario_id") == scenario_id:
-                    return data
-        raise HTTPException(status_code=404, detail="Scenario ID not found in any JSON.")
-    except (BotoCoreError, ClientError, Exception) as e:
-        raise HTTPException(status_code=500, detail=f"Error reading scenario: {str(e)}")
+def get_scenario(scenario_id: str, response: Response):
+    """Return a scenario; ``scenario_id@version`` pins an immutable version."""
+    _, data = _scenario_or_404(scenario_id, response)
+    return data
+
+
+@sim_router.get("/{scenario_id}/manifest")
+def get_scenario_manifest(scenario_id: str, response: Response):
+    """Return scenario metadata and a step outline.
+
+    Only the first step's body (and the steps reachable from it) is inlined, so
+    the page can render it without a second round trip.
+    """
+    version, data = _scenario_or_404(scenario_id, response)
+
+    steps = data.get("steps", [])
+    return {
+        "scenario_id": data.get("scenario_id"),
+        "version": version,
+        "name": data.get("name"),
+        "description": data.get("description"),
+        "type": data.get("type", "Default"),
+        "difficulty": data.get("difficulty", "Easy"),
+        "step_count": len(steps),
+        "first_step_id": steps[0].get("id") if steps else None,
+        "first_step": _step_payload(steps, 0, prefetch=True) if steps else None,
+        "steps": [
+            {"id": step.get("id"), "index": index, "title": step.get("title")}
+            for index, step in enumerate(steps)
+        ],
+    }
+
+
+@sim_router.get("/{scenario_id}/steps/{step_id}")
+def get_scenario_step(scenario_id: str, step_id: int, response: Response, prefetch: bool = False):
+    """Return a single step, optionally with the steps reachable from it."""
+    version, data = _scenario_or_404(scenario_id, response)
+
+    steps = data.get("steps", [])
+    index = next((i for i, step in enumerate(steps) if step.get("id") == step_id), None)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Step not found in scenario.")
+
+    return {"version": version, **_step_payload(steps, index, prefetch)}
 
 @sim_router.post("/upload-scenario")
 async def upload_scenario(file: UploadFile = File(...)):
@@ -76,43 +197,32 @@ async def upload_scenario(file: UploadFile = File(...)):
         # Validate using Pydantic model
         SimScenario(**parsed)
 
-        s3_client.put_object(Bucket=BUCKET_NAME, Key=sanitized_name, Body=contents)
+        version, created = get_scenario_store().put_scenario(sanitized_name, contents)
+        _scenario_cache.clear()
 
         return {
             "filename": sanitized_name,
+            "version": version,
+            "deduplicated": not created,
             "size": len(decoded),
             "upload_time": datetime.utcnow().isoformat() + "Z"
         }
+    except ScenarioStoreReadOnly as e:
+        raise HTTPException(status_code=403, detail=str(e))
     except (BotoCoreError, ClientError, Exception) as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
 @sim_router.delete("/delete-scenario/{scenario_id}")
 def delete_scenario(scenario_id: str):
-    """Delete a scenario JSON file from the S3 bucket by scenario id or filename."""
+    """Delete a scenario JSON file from the scenario store by scenario id or filename."""
     try:
-        sanitized_param = os.path.basename(scenario_id)
-        normalized_param = os.path.splitext(sanitized_param)[0]
-
-        response = s3_client.list_objects_v2(Bucket=BUCKET_NAME)
-        for obj in response.get("Contents", []):
-            key = obj["Key"]
-            if not key.endswith(".json"):
-                continue
-            if sanitized_param == key or normalized_param == os.path.splitext(os.path.basename(key))[0]:
-                s3_client.delete_object(Bucket=BUCKET_NAME, Key=key)
-                return {"status": "deleted"}
-
-            file_obj = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
-            data = json.loads(file_obj["Body"].read().decode("utf-8"))
-            if data.get("scenario_id") == scenario_id:
-                s3_client.delete_object(Bucket=BUCKET_NAME, Key=key)
-                return {"status": "deleted"}
-        raise HTTPException(status_code=404, detail="Scenario not found")
+        deleted = get_scenario_store().delete_scenario(scenario_id)
+    except ScenarioStoreReadOnly as e:
+        raise HTTPException(status_code=403, detail=str(e))
     except (BotoCoreError, ClientError, Exception) as e:
         raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
-
-
-    
-
-
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    _scenario_cache.clear()
+    return {"status": "deleted"}
@@ -0,0 +1,167 @@
+"""Admission control for expensive and abuse-prone routes.
+
+Each guarded route gets a concurrency cap and/or a token bucket keyed by the
+client IP (and additionally the acting user). Requests over the limit are
+rejected before they touch the database: 503 when the route is saturated, 429
+when a client is over its rate. Unlisted routes pass straight through.
+
+All state is per process. On Lambda each instance serves one request at a
+time, so the concurrency caps never trigger there and token buckets only see
+the traffic that lands on one warm instance. The shared limits for that
+deployment are Lambda reserved concurrency and API Gateway throttling, set in
+Terraform; these caps protect uvicorn-style hosts that serve many requests per
+process.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") != "0"
+MAX_BUCKETS = 10_000  # cap on tracked clients per process
+
+
+class RoutePolicy:
+    """Limits applied to a single route."""
+
+    def __init__(
+        self,
+        max_concurrent: int | None = None,
+        rate: float | None = None,
+        burst: int = 1,
+        key: str = "ip",
+    ):
+        self.max_concurrent = max_concurrent
+        self.rate = rate  # tokens refilled per second
+        self.burst = burst  # bucket capacity
+        self.key = key  # "ip" or "actor"
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume a token; return 0 on success or seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+POLICIES: dict[tuple[str, str], RoutePolicy] = {
+    # credential stuffing shows up as bursts of failed logins from one address
+    ("POST", "/logs/log-failed-login"): RoutePolicy(max_concurrent=8, rate=0.5, burst=5, key="ip"),
+    ("POST", "/logs/log-login"): RoutePolicy(max_concurrent=8, rate=1.0, burst=10, key="ip"),
+    # full-table reads and S3 scans
+    ("GET", "/audit/export"): RoutePolicy(max_concurrent=1, rate=0.1, burst=2, key="actor"),
+    ("GET", "/audit/logs"): RoutePolicy(max_concurrent=3),
+    ("GET", "/logs/login-activity"): RoutePolicy(max_concurrent=3),
+    ("GET", "/progress/all"): RoutePolicy(max_concurrent=3),
+    ("GET", "/sim/list"): RoutePolicy(max_concurrent=4, rate=2.0, burst=10, key="ip"),
+    # maintenance jobs that rewrite whole tables; one at a time per process
+    ("POST", "/progress/compact"): RoutePolicy(max_concurrent=1),
+    ("POST", "/progress/step-stats/rebuild"): RoutePolicy(max_concurrent=1),
+}
+
+_lock = threading.Lock()
+_in_flight: Counter = Counter()
+_buckets: dict[tuple[str, str, str], TokenBucket] = {}
+_admitted: Counter = Counter()
+_shed: Counter = Counter()
+
+
+def _client_keys(request: Request, policy: RoutePolicy) -> list[str]:
+    """Return the bucket keys a request must have a token in."""
+    # The leftmost X-Forwarded-For entry is whatever the client sent, so key on
+    # the peer address, or failing that the hop the last proxy appended.
+    if request.client and request.client.host:
+        ip_key = f"ip:{request.client.host}"
+    else:
+        forwarded_for = request.headers.get("x-forwarded-for", "")
+        ip_key = f"ip:{forwarded_for.rsplit(',', 1)[-1].strip() or None}"
+    if policy.key == "actor":
+        # x-user is unauthenticated, so actor buckets are checked on top of the
+        # IP bucket; rotating it from one address can't mint fresh allowance
+        actor = request.headers.get("x-user")
+        if actor:
+            return [ip_key, f"actor:{actor}"]
+    return [ip_key]
+
+
+def _bucket_for(route: tuple[str, str], client: str, policy: RoutePolicy) -> TokenBucket:
+    key = (route[0], route[1], client)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        if len(_buckets) >= MAX_BUCKETS:
+            # forget the least recently used half rather than growing without bound
+            stale = sorted(_buckets, key=lambda k: _buckets[k].updated)[: MAX_BUCKETS // 2]
+            for k in stale:
+                del _buckets[k]
+        bucket = _buckets[key] = TokenBucket(policy.rate, policy.burst)
+    return bucket
+
+
+def _reject(status_code: int, retry_after: float, detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+async def admission_middleware(request: Request, call_next):
+    """Shed requests to guarded routes that are over their limits."""
+    route = (request.method, request.url.path)
+    policy = POLICIES.get(route) if ADMISSION_ENABLED else None
+    if policy is None:
+        return await call_next(request)
+
+    label = f"{route[0]} {route[1]}"
+    with _lock:
+        if policy.rate is not None:
+            wait = max(
+                _bucket_for(route, client, policy).take()
+                for client in _client_keys(request, policy)
+            )
+            if wait:
+                _shed[(label, "rate_limited")] += 1
+                return _reject(429, wait, "Too many requests")
+        if policy.max_concurrent is not None and _in_flight[label] >= policy.max_concurrent:
+            _shed[(label, "overloaded")] += 1
+            return _reject(503, 1, "Server busy, try again shortly")
+        _in_flight[label] += 1
+        _admitted[label] += 1
+
+    try:
+        return await call_next(request)
+    finally:
+        with _lock:
+            _in_flight[label] -= 1
+
+
+def get_admission_stats() -> dict:
+    """Return per-route in-flight, admitted and shed counters for this process."""
+    with _lock:
+        routes = {}
+        for method, path in POLICIES:
+            label = f"{method} {path}"
+            routes[label] = {
+                "in_flight": _in_flight[label],
+                "admitted": _admitted[label],
+                "rate_limited": _shed[(label, "rate_limited")],
+                "overloaded": _shed[(label, "overloaded")],
+            }
+        return {"enabled": ADMISSION_ENABLED, "routes": routes}
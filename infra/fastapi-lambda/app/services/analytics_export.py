@@ -0,0 +1,264 @@
+"""Incremental columnar export of training analytics.
+
+Writes audit logs, completed attempts and their steps to Parquet (or Arrow IPC)
+files partitioned by table and day::
+
+    <out>/audit_logs/date=2025-07-01/part-20250702T030000000000-0000.parquet
+    <out>/simulation_progress/date=2025-07-01/part-20250702T030000000000-0000.parquet
+    <out>/simulation_steps/date=2025-07-01/part-20250702T030000000000-0000.parquet
+
+``<out>/_watermarks.json`` records, per source, the time up to which rows have
+been exported. Each run exports rows stamped between that watermark and
+``COMMIT_LAG`` before the database's current time. Serial ids are allocated
+before commit, so an id cursor skips rows that commit late. A time window
+that stops short of "now" does not, as long as transactions finish within
+the lag.
+
+Attempts are exported once they are compacted into ``simulation_analytics``,
+which happens when they complete. Steps recorded after completion re-compact
+the attempt and bump its ``updated_at``, so the attempt and all of its steps
+are exported again. Consumers keep the row with the latest ``updated_at`` per
+``sim_uuid`` (and ``sim_uuid, sequence`` for steps).
+
+Attempts that are never completed (abandoned, or ended early from the
+simulation page) are never compacted. They are deliberately not exported:
+their step rows stay live in ``simulation_step_progress`` and can still
+change.
+
+Run it offline against a replica or the production database::
+
+    python -m services.analytics_export /data/redroomsim-analytics
+"""
+
+import argparse
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import func, tuple_
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed where exports run
+    pa = None
+
+from db import SessionLocal
+from models.logging_models import AuditLog
+from models.progress_models import SimulationAnalytics, SimulationProgress
+
+WATERMARK_FILE = "_watermarks.json"
+BATCH_SIZE = 10_000
+# rows stamped more recently may belong to transactions that haven't committed
+COMMIT_LAG = timedelta(minutes=10)
+
+
+def _schemas() -> dict:
+    return {
+        "audit_logs": pa.schema([
+            ("id", pa.int64()),
+            ("actor", pa.string()),
+            ("action", pa.string()),
+            ("details", pa.string()),
+            ("screen", pa.string()),
+            ("timestamp", pa.timestamp("us", tz="UTC")),
+        ]),
+        "simulation_progress": pa.schema([
+            ("sim_uuid", pa.string()),
+            ("scenario_id", pa.string()),
+            ("name", pa.string()),
+            ("username", pa.string()),
+            ("score", pa.int32()),
+            ("step_count", pa.int32()),
+            ("total_time_ms", pa.int64()),
+            ("started_at", pa.timestamp("us")),
+            ("ended_at", pa.timestamp("us")),
+            ("updated_at", pa.timestamp("us")),
+        ]),
+        "simulation_steps": pa.schema([
+            ("sim_uuid", pa.string()),
+            ("scenario_id", pa.string()),
+            ("username", pa.string()),
+            ("sequence", pa.int32()),
+            ("step_index", pa.int32()),
+            ("decision", pa.string()),
+            ("feedback", pa.string()),
+            ("time_ms", pa.int64()),
+            ("timestamp", pa.timestamp("us")),
+            ("updated_at", pa.timestamp("us")),
+        ]),
+    }
+
+
+def _parse_time(value: str | None) -> datetime | None:
+    """Parse a timeline timestamp into naive UTC to match the step table."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _day(value: datetime | None) -> str:
+    return value.date().isoformat() if value else "unknown"
+
+
+def load_watermarks(out_dir: Path) -> dict:
+    path = out_dir / WATERMARK_FILE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_watermarks(out_dir: Path, watermarks: dict) -> None:
+    # write then rename so a crash never leaves a half-written watermark file
+    path = out_dir / WATERMARK_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(watermarks, indent=2))
+    os.replace(tmp, path)
+
+
+def _batches(query, column, id_column, start: datetime | None, end: datetime):
+    """Yield batches of ``query`` rows with ``start <= column < end``.
+
+    Rows come back as ``(*entities, column, id)`` ordered by that pair, which
+    also serves as the keyset cursor between batches.
+    """
+    query = query.add_columns(column, id_column).filter(column < end)
+    if start is not None:
+        query = query.filter(column >= start)
+    position = None
+    while True:
+        page = query
+        if position is not None:
+            page = page.filter(tuple_(column, id_column) > tuple_(*position))
+        rows = page.order_by(column, id_column).limit(BATCH_SIZE).all()
+        if not rows:
+            return
+        yield rows
+        position = tuple(rows[-1][-2:])
+
+
+def _write_partitions(out_dir: Path, table: str, rows_by_day: dict, part: str, fmt: str) -> int:
+    """Write one file per day partition and return the number of rows written."""
+    schema = _schemas()[table]
+    written = 0
+    for day, rows in rows_by_day.items():
+        partition = out_dir / table / f"date={day}"
+        partition.mkdir(parents=True, exist_ok=True)
+        arrow_table = pa.Table.from_pylist(rows, schema=schema)
+        if fmt == "arrow":
+            feather.write_feather(arrow_table, partition / f"part-{part}.arrow")
+        else:
+            pq.write_table(arrow_table, partition / f"part-{part}.parquet")
+        written += len(rows)
+    return written
+
+
+def export_audit_logs(db, out_dir: Path, start: datetime | None, end: datetime, fmt: str) -> int:
+    """Export audit rows stamped in ``[start, end)``; return rows written."""
+    run = end.strftime("%Y%m%dT%H%M%S%f")
+    written = 0
+    query = db.query(AuditLog)
+    for batch_no, batch in enumerate(_batches(query, AuditLog.timestamp, AuditLog.id, start, end)):
+        rows_by_day = defaultdict(list)
+        for log, _, _ in batch:
+            rows_by_day[_day(log.timestamp)].append({
+                "id": log.id,
+                "actor": log.actor,
+                "action": log.action,
+                "details": log.details,
+                "screen": log.screen,
+                "timestamp": log.timestamp,
+            })
+        written += _write_partitions(out_dir, "audit_logs", rows_by_day, f"{run}-{batch_no:04d}", fmt)
+    return written
+
+
+def export_attempts(db, out_dir: Path, start: datetime | None, end: datetime, fmt: str) -> int:
+    """Export attempts compacted or re-compacted in ``[start, end)`` with their steps.
+
+    Returns the number of attempts written.
+    """
+    run = end.strftime("%Y%m%dT%H%M%S%f")
+    written = 0
+    query = (
+        db.query(SimulationAnalytics, SimulationProgress.name)
+        .outerjoin(SimulationProgress, SimulationProgress.sim_uuid == SimulationAnalytics.sim_uuid)
+    )
+    batches = _batches(query, SimulationAnalytics.updated_at, SimulationAnalytics.id, start, end)
+    for batch_no, batch in enumerate(batches):
+        attempts_by_day = defaultdict(list)
+        steps_by_day = defaultdict(list)
+        for analytics, name, _, _ in batch:
+            timeline = analytics.timeline or {}
+            totals = timeline.get("totals", {})
+            day = _day(analytics.ended_at or analytics.started_at)
+            attempts_by_day[day].append({
+                "sim_uuid": str(analytics.sim_uuid),
+                "scenario_id": analytics.scenario_id,
+                "name": name,
+                "username": analytics.uid,
+                "score": analytics.score,
+                "step_count": totals.get("step_count"),
+                "total_time_ms": totals.get("total_time_ms"),
+                "started_at": analytics.started_at,
+                "ended_at": analytics.ended_at,
+                "updated_at": analytics.updated_at,
+            })
+            for position, step in enumerate(timeline.get("steps", []), start=1):
+                steps_by_day[day].append({
+                    "sim_uuid": str(analytics.sim_uuid),
+                    "scenario_id": analytics.scenario_id,
+                    "username": analytics.uid,
+                    "sequence": step.get("sequence", position),
+                    "step_index": step.get("step_index"),
+                    "decision": step.get("decision"),
+                    "feedback": step.get("feedback"),
+                    "time_ms": step.get("timeMs"),
+                    "timestamp": _parse_time(step.get("timestamp")),
+                    "updated_at": analytics.updated_at,
+                })
+        part = f"{run}-{batch_no:04d}"
+        written += _write_partitions(out_dir, "simulation_progress", attempts_by_day, part, fmt)
+        _write_partitions(out_dir, "simulation_steps", steps_by_day, part, fmt)
+    return written
+
+
+def run_export(out_dir: str | Path, fmt: str = "parquet") -> dict:
+    """Export rows stamped since the stored watermarks and return rows written per source."""
+    if pa is None:
+        raise RuntimeError("pyarrow is required for analytics export: pip install pyarrow")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    watermarks = load_watermarks(out_dir)
+
+    db = SessionLocal()
+    try:
+        # use the database clock so app/DB clock skew can't open a gap
+        end = db.query(func.now()).scalar() - COMMIT_LAG
+        counts = {}
+        exports = (("audit_logs", export_audit_logs), ("attempts", export_attempts))
+        for source, export in exports:
+            start = watermarks.get(source)
+            start = datetime.fromisoformat(start) if start else None
+            if start is not None and start >= end:
+                counts[source] = 0
+                continue
+            counts[source] = export(db, out_dir, start, end, fmt)
+            # persist after each source so a failure in one doesn't re-export the other
+            watermarks[source] = end.isoformat()
+            save_watermarks(out_dir, watermarks)
+        return counts
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental columnar export of training analytics")
+    parser.add_argument("out_dir", help="directory to write partitioned files into")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    args = parser.parse_args()
+    print(json.dumps(run_export(args.out_dir, args.format)))
@@ -0,0 +1,147 @@
+"""Change feed behind the admin monitoring stream.
+
+Database triggers append audit, login and progress changes to
+``monitor_events`` and ``NOTIFY monitor_events`` with the event's channel.
+One listener thread per process holds a dedicated connection on that channel
+and wakes the streams subscribed to it, which then read the new rows past
+their own cursor. Streams also re-check on a timer, so a missed notification
+only delays delivery. The publishing trigger also prunes events older than a
+day, so the table stays bounded whether or not anyone is listening.
+
+Event ids are allocated when the trigger fires, not when the writing
+transaction commits, so an id cursor would skip a row that commits after a
+higher id has been delivered. Each row therefore records the id of the
+transaction that wrote it, and events are delivered in ``(xid, id)`` order,
+only once their transaction is older than every transaction still running
+(``pg_snapshot_xmin``). Anything that commits later has a higher xid than
+everything already delivered, so the ``"<xid>-<id>"`` cursor never skips it.
+"""
+
+import asyncio
+import logging
+import select
+import threading
+import time
+
+from sqlalchemy import text, tuple_
+
+from db import SessionLocal, engine
+from models.logging_models import MonitorEvent
+
+CHANNEL = "monitor_events"
+CHANNELS = ("audit", "login", "progress")
+
+
+def format_cursor(position: tuple[int, int]) -> str:
+    return f"{position[0]}-{position[1]}"
+
+
+def parse_cursor(value: str) -> tuple[int, int] | None:
+    """Parse an ``"<xid>-<id>"`` cursor; None when it is malformed."""
+    xid, _, event_id = value.partition("-")
+    if not (xid.isdigit() and event_id.isdigit()):
+        return None
+    return int(xid), int(event_id)
+
+
+def _settled(db, query):
+    """Restrict ``query`` to events whose writing transaction can't still be open."""
+    if engine.dialect.name != "postgresql":
+        return query
+    horizon = db.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar()
+    return query.filter(MonitorEvent.xid < horizon)
+
+
+def fetch_events(cursor: tuple[int, int], channels: tuple[str, ...], limit: int = 500) -> list[dict]:
+    """Return settled events after ``cursor`` on the given channels, oldest first."""
+    db = SessionLocal()
+    try:
+        query = db.query(MonitorEvent).filter(
+            tuple_(MonitorEvent.xid, MonitorEvent.id) > tuple_(*cursor),
+            MonitorEvent.channel.in_(channels),
+        )
+        rows = _settled(db, query).order_by(MonitorEvent.xid, MonitorEvent.id).limit(limit).all()
+        return [
+            {
+                "cursor": format_cursor((r.xid, r.id)),
+                "position": (r.xid, r.id),
+                "channel": r.channel,
+                "payload": r.payload,
+            }
+            for r in rows
+        ]
+    finally:
+        db.close()
+
+
+def latest_cursor() -> tuple[int, int]:
+    """Return the position of the newest settled event, used when a client doesn't resume."""
+    db = SessionLocal()
+    try:
+        query = db.query(MonitorEvent.xid, MonitorEvent.id)
+        row = _settled(db, query).order_by(MonitorEvent.xid.desc(), MonitorEvent.id.desc()).first()
+        return (row[0], row[1]) if row else (0, 0)
+    finally:
+        db.close()
+
+
+class MonitorNotifier:
+    """Fan NOTIFY wake-ups from one LISTEN connection out to asyncio subscribers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: set[tuple[asyncio.AbstractEventLoop, asyncio.Event, tuple[str, ...]]] = set()
+        self._thread: threading.Thread | None = None
+
+    def subscribe(self, channels: tuple[str, ...] = CHANNELS) -> asyncio.Event:
+        wakeup = asyncio.Event()
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), wakeup, channels))
+            if self._thread is None and engine.dialect.name == "postgresql":
+                self._thread = threading.Thread(target=self._listen, name="monitor-listener", daemon=True)
+                self._thread.start()
+        return wakeup
+
+    def unsubscribe(self, wakeup: asyncio.Event) -> None:
+        with self._lock:
+            self._subscribers = {s for s in self._subscribers if s[1] is not wakeup}
+
+    def publish(self, channel: str | None = None) -> None:
+        """Wake the subscribers of ``channel`` (or all of them) so they re-read the feed."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, wakeup, channels in subscribers:
+            if channel is None or channel in channels:
+                loop.call_soon_threadsafe(wakeup.set)
+
+    def _listen(self) -> None:
+        while True:
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                raw.detach()  # LISTEN state must not leak back into the pool
+                conn = raw.driver_connection
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        channels = {n.payload for n in conn.notifies}
+                        conn.notifies.clear()
+                        for channel in channels:
+                            self.publish(channel)
+            except Exception:
+                logging.exception("Monitor listener lost its connection, reconnecting")
+                time.sleep(5)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+
+notifier = MonitorNotifier()
@@ -0,0 +1,256 @@
+"""Opt-in statistical request profiler.
+
+A request is profiled when it carries an ``x-profile-token`` header matching
+``PROFILER_TOKEN`` or when it is picked by ``PROFILE_SAMPLE_RATE``. While the
+request runs, a background thread samples the Python stacks of every other
+thread, which covers both async routes on the event loop and sync routes in
+the threadpool. Profiles are written to ``PROFILE_DIR`` as JSON holding the
+route, timing and collapsed stack counts, or to ``PROFILE_BUCKET`` under
+``profiles/`` so every Lambda instance sees the same set.
+"""
+
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+from botocore.exceptions import BotoCoreError, ClientError
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+PROFILER_TOKEN = os.environ.get("PROFILER_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "/tmp/redroomsim-profiles"))
+# /tmp is per Lambda instance; a bucket lets any instance serve any profile
+PROFILE_BUCKET = os.environ.get("PROFILE_BUCKET")
+PROFILE_PREFIX = "profiles/"
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+
+# Leaf frames of threads that are just waiting for work
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Collect stack samples from all other threads at a fixed interval."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(f"thread {names.get(thread_id, thread_id)}")
+                self.samples[tuple(reversed(stack))] += 1
+
+
+def _should_profile(request: Request) -> bool:
+    if request.url.path.startswith("/profiles"):
+        return False
+    token = request.headers.get("x-profile-token")
+    if PROFILER_TOKEN and token and hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode()):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@lru_cache(maxsize=1)
+def _s3():
+    import boto3
+
+    return boto3.client("s3")
+
+
+def _profile_ids() -> list[str]:
+    """Return stored profile ids, newest first."""
+    stamped = []
+    if PROFILE_BUCKET:
+        paginator = _s3().get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=PROFILE_BUCKET, Prefix=PROFILE_PREFIX):
+            for obj in page.get("Contents", []):
+                name = obj["Key"][len(PROFILE_PREFIX):]
+                if name.endswith(".json"):
+                    stamped.append((obj["LastModified"].timestamp(), name[:-5]))
+    elif PROFILE_DIR.exists():
+        for path in PROFILE_DIR.glob("*.json"):
+            try:
+                stamped.append((path.stat().st_mtime, path.stem))
+            except FileNotFoundError:
+                continue  # pruned by a concurrent request
+    return [profile_id for _, profile_id in sorted(stamped, reverse=True)]
+
+
+def _write_profile(profile_id: str, body: str) -> None:
+    if PROFILE_BUCKET:
+        _s3().put_object(Bucket=PROFILE_BUCKET, Key=f"{PROFILE_PREFIX}{profile_id}.json", Body=body.encode("utf-8"))
+    else:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        (PROFILE_DIR / f"{profile_id}.json").write_text(body)
+
+
+def _read_profile(profile_id: str) -> str | None:
+    """Return a stored profile's JSON, or None if it doesn't exist (or was pruned)."""
+    if PROFILE_BUCKET:
+        client = _s3()
+        try:
+            obj = client.get_object(Bucket=PROFILE_BUCKET, Key=f"{PROFILE_PREFIX}{profile_id}.json")
+        except client.exceptions.NoSuchKey:
+            return None
+        return obj["Body"].read().decode("utf-8")
+    try:
+        return (PROFILE_DIR / f"{profile_id}.json").read_text()
+    except FileNotFoundError:
+        return None
+
+
+def _prune_profiles() -> None:
+    for profile_id in _profile_ids()[PROFILE_MAX_FILES:]:
+        if PROFILE_BUCKET:
+            _s3().delete_object(Bucket=PROFILE_BUCKET, Key=f"{PROFILE_PREFIX}{profile_id}.json")
+        else:
+            (PROFILE_DIR / f"{profile_id}.json").unlink(missing_ok=True)
+
+
+def _save_profile(request: Request, status_code: int | None, duration_ms: float, sampler: StackSampler) -> str:
+    profile_id = uuid.uuid4().hex
+    route = request.scope.get("route")
+    document = {
+        "id": profile_id,
+        "method": request.method,
+        "path": request.url.path,
+        "route": getattr(route, "path", None),
+        "status_code": status_code,
+        "duration_ms": round(duration_ms, 3),
+        "interval_ms": sampler.interval * 1000,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "samples": [[list(stack), count] for stack, count in sampler.samples.most_common()],
+    }
+    _write_profile(profile_id, json.dumps(document))
+    _prune_profiles()
+    return profile_id
+
+
+async def profile_middleware(request: Request, call_next):
+    """Profile selected requests; all others pay only the header check."""
+    if not _should_profile(request):
+        return await call_next(request)
+
+    sampler = StackSampler()
+    start = time.perf_counter()
+    sampler.start()
+    response = None
+    try:
+        response = await call_next(request)
+        return response
+    finally:
+        sampler.stop()
+        duration_ms = (time.perf_counter() - start) * 1000
+        try:
+            # file writes and pruning stay off the event loop
+            profile_id = await run_in_threadpool(
+                _save_profile, request, response.status_code if response else None, duration_ms, sampler
+            )
+            if response is not None:
+                response.headers["x-profile-id"] = profile_id
+        except (OSError, BotoCoreError, ClientError):
+            # Never interrupt a request if the profile can't be stored
+            pass
+
+
+def list_profiles(limit: int = 50) -> list[dict]:
+    """Return metadata for the newest ``limit`` stored profiles, newest first."""
+    profiles = []
+    for profile_id in _profile_ids()[:limit]:
+        body = _read_profile(profile_id)
+        if body is None:
+            continue
+        document = json.loads(body)
+        document.pop("samples", None)
+        profiles.append(document)
+    return profiles
+
+
+def load_profile(profile_id: str) -> dict | None:
+    # profile ids are uuid hex strings; reject anything that could escape the directory
+    if not profile_id.isalnum():
+        return None
+    body = _read_profile(profile_id)
+    return json.loads(body) if body is not None else None
+
+
+def to_collapsed(document: dict) -> str:
+    """Render samples in the collapsed stack format used by flamegraph tools."""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in document["samples"])
+
+
+def to_speedscope(document: dict) -> dict:
+    """Render samples as a speedscope sampled profile."""
+    frames: list[dict] = []
+    frame_index: dict[str, int] = {}
+    samples = []
+    weights = []
+    for stack, count in document["samples"]:
+        indexes = []
+        for label in stack:
+            if label not in frame_index:
+                frame_index[label] = len(frames)
+                frames.append({"name": label})
+            indexes.append(frame_index[label])
+        samples.append(indexes)
+        weights.append(count * document["interval_ms"])
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": f"{document['method']} {document['path']}",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+        "name": f"{document['method']} {document['path']}",
+        "exporter": "redroomsim",
+    }
@@ -0,0 +1,407 @@
+"""Scenario storage backends.
+
+Scenarios are content-addressed. Every upload is stored once under the
+SHA-256 of its bytes and never modified::
+
+    versions/<sha256>.json      immutable scenario document
+    aliases/<scenario_id>.json  {"scenario_id", "version", "filename"} pointer
+
+Re-uploading a scenario moves its alias to the new version; identical
+uploads share one version object. Plain ``*.json`` files at the top level
+(the layout used before versioning) are still served, unversioned, until
+``python -m services.scenario_store --migrate`` adopts them. Reads never
+write to the store.
+
+``get_scenario_store`` picks the backend from the environment:
+
+* ``SCENARIO_STORE=s3`` (default) reads ``SCENARIO_BUCKET``.
+* ``SCENARIO_STORE=file`` reads ``SCENARIO_PATH``, either a directory or a
+  packed bundle built with ``python -m services.scenario_store``.
+* ``SCENARIO_STORE=memory`` keeps scenarios in process, for tests and benchmarks.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+DEFAULT_BUCKET = "redroomsimbucket"
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / "data" / "scenarios.bundle"
+
+VERSIONS = "versions/"
+ALIASES = "aliases/"
+VERSION_RE = re.compile(r"^[0-9a-f]{64}$")
+
+BUNDLE_MAGIC = b"RRSBNDL2"
+_HEADER = struct.Struct("<8sQ")  # magic, index length
+
+
+class ScenarioStoreReadOnly(Exception):
+    """Raised when writing to a store that cannot be modified."""
+
+
+def content_version(contents: bytes) -> str:
+    """Return the content address of a scenario document."""
+    return hashlib.sha256(contents).hexdigest()
+
+
+class ScenarioStore:
+    """Base class for scenario backends.
+
+    Subclasses implement the key primitives (``keys``, ``exists``, ``read``,
+    ``write`` and ``remove``); versioning and lookups by scenario id are built
+    on top of them here. ``keys(prefix)`` lists the ``*.json`` keys directly
+    under ``prefix``.
+    """
+
+    read_only = False
+
+    def keys(self, prefix: str = "") -> list[str]:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def read(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def write(self, key: str, contents: bytes) -> None:
+        raise NotImplementedError
+
+    def remove(self, key: str) -> None:
+        raise NotImplementedError
+
+    def read_optional(self, key: str) -> bytes | None:
+        """Return the object under ``key`` or None when it doesn't exist."""
+        try:
+            return self.read(key)
+        except (KeyError, FileNotFoundError):
+            return None
+
+    def _alias(self, scenario_id: str) -> dict | None:
+        contents = self.read_optional(f"{ALIASES}{os.path.basename(scenario_id)}.json")
+        return json.loads(contents) if contents is not None else None
+
+    def _write_alias(self, scenario_id: str, version: str, filename: str) -> None:
+        alias = {
+            "scenario_id": scenario_id,
+            "version": version,
+            "filename": filename,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.write(f"{ALIASES}{os.path.basename(scenario_id)}.json", json.dumps(alias).encode("utf-8"))
+
+    def _legacy_files(self):
+        """Yield ``(key, contents)`` for top-level files from before versioning."""
+        for key in self.keys():
+            contents = self.read_optional(key)
+            if contents is not None:  # deleted since it was listed
+                yield key, contents
+
+    def _legacy(self, scenario_id: str) -> tuple[str, bytes] | None:
+        for key, contents in self._legacy_files():
+            if json.loads(contents).get("scenario_id") == scenario_id:
+                return key, contents
+        return None
+
+    def get_version(self, version: str) -> dict | None:
+        """Return the immutable document stored under ``version``."""
+        if not VERSION_RE.match(version):
+            return None
+        contents = self.read_optional(f"{VERSIONS}{version}.json")
+        return json.loads(contents) if contents is not None else None
+
+    def resolve(self, scenario_id: str) -> tuple[str | None, dict | None]:
+        """Return ``(version, document)`` currently aliased to ``scenario_id``."""
+        alias = self._alias(scenario_id)
+        if alias:
+            return alias["version"], self.get_version(alias["version"])
+
+        legacy = self._legacy(scenario_id)
+        if legacy is None:
+            return None, None
+        return None, json.loads(legacy[1])
+
+    def get_scenario(self, scenario_id: str) -> dict | None:
+        """Return the current document for ``scenario_id``."""
+        return self.resolve(scenario_id)[1]
+
+    def list_scenarios(self) -> list[tuple[str, str | None, dict]]:
+        """Return ``(filename, version, document)`` for every current scenario."""
+        scenarios = []
+        seen = set()
+        for key in self.keys(ALIASES):
+            contents = self.read_optional(key)
+            if contents is None:
+                continue
+            alias = json.loads(contents)
+            data = self.get_version(alias["version"])
+            if data is not None:
+                seen.add(alias["scenario_id"])
+                scenarios.append((alias.get("filename", key), alias["version"], data))
+        for key, contents in self._legacy_files():
+            data = json.loads(contents)
+            if data.get("scenario_id") not in seen:
+                scenarios.append((key, None, data))
+        return scenarios
+
+    def migrate_legacy(self) -> int:
+        """Version every top-level file whose scenario id has no alias yet.
+
+        A one-off upgrade step, run explicitly rather than on read. The old
+        files are left in place (aliases take precedence over them) and can be
+        deleted once the migration has been checked. Returns the number of
+        scenarios adopted.
+        """
+        if self.read_only:
+            raise ScenarioStoreReadOnly("Scenario storage is read-only")
+        migrated = 0
+        for key, contents in self._legacy_files():
+            scenario_id = json.loads(contents).get("scenario_id")
+            if scenario_id and self._alias(scenario_id) is None:
+                self.put_scenario(key, contents)
+                migrated += 1
+        return migrated
+
+    def put_scenario(self, filename: str, contents: bytes) -> tuple[str, bool]:
+        """Store ``contents`` and point its scenario id at it.
+
+        Returns the version and whether a new version object was written.
+        """
+        if self.read_only:
+            raise ScenarioStoreReadOnly("Scenario storage is read-only")
+        scenario_id = json.loads(contents)["scenario_id"]
+        version = content_version(contents)
+        key = f"{VERSIONS}{version}.json"
+        created = not self.exists(key)
+        if created:
+            self.write(key, contents)
+        self._write_alias(scenario_id, version, filename)
+        return version, created
+
+    def delete_scenario(self, scenario_id: str) -> bool:
+        """Remove a scenario by file name, file stem or scenario id.
+
+        Only the alias is removed; version objects stay so attempts pinned
+        to them can still be replayed.
+        """
+        if self.read_only:
+            raise ScenarioStoreReadOnly("Scenario storage is read-only")
+
+        sanitized_param = os.path.basename(scenario_id)
+        normalized_param = os.path.splitext(sanitized_param)[0]
+        deleted = False
+        for key in self.keys(ALIASES):
+            alias = json.loads(self.read(key))
+            filename = alias.get("filename", "")
+            if (
+                alias["scenario_id"] == scenario_id
+                or sanitized_param == filename
+                or normalized_param == os.path.splitext(filename)[0]
+            ):
+                self.remove(key)
+                deleted = True
+        for key in self.keys():
+            if sanitized_param == key or normalized_param == os.path.splitext(os.path.basename(key))[0]:
+                self.remove(key)
+                deleted = True
+            elif json.loads(self.read(key)).get("scenario_id") == scenario_id:
+                self.remove(key)
+                deleted = True
+        return deleted
+
+
+class S3ScenarioStore(ScenarioStore):
+    """Scenarios stored as JSON objects in an S3 bucket."""
+
+    def __init__(self, bucket: str = DEFAULT_BUCKET, client=None):
+        if client is None:
+            import boto3
+
+            client = boto3.client("s3")
+        self.bucket = bucket
+        self.client = client
+
+    def keys(self, prefix: str = "") -> list[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        keys = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter="/"):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []) if obj["Key"].endswith(".json"))
+        return keys
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def read(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def read_optional(self, key: str) -> bytes | None:
+        # one GET instead of HEAD + GET
+        try:
+            return self.read(key)
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def write(self, key: str, contents: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=contents)
+
+    def remove(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+class MemoryScenarioStore(ScenarioStore):
+    """Scenarios held in a dict; nothing leaves the process."""
+
+    def __init__(self, scenarios: dict[str, bytes] | None = None):
+        self.scenarios = dict(scenarios or {})
+
+    def keys(self, prefix: str = "") -> list[str]:
+        return sorted(
+            key for key in self.scenarios
+            if key.startswith(prefix) and "/" not in key[len(prefix):] and key.endswith(".json")
+        )
+
+    def exists(self, key: str) -> bool:
+        return key in self.scenarios
+
+    def read(self, key: str) -> bytes:
+        return self.scenarios[key]
+
+    def write(self, key: str, contents: bytes) -> None:
+        self.scenarios[key] = contents
+
+    def remove(self, key: str) -> None:
+        del self.scenarios[key]
+
+
+class DirectoryScenarioStore(ScenarioStore):
+    """Scenarios stored as files under a local directory."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    def _path(self, key: str) -> Path:
+        # keys are at most one directory deep; never let them leave the root
+        prefix, _, name = key.rpartition("/")
+        if prefix not in ("", VERSIONS.rstrip("/"), ALIASES.rstrip("/")):
+            raise ValueError(f"Invalid scenario key: {key}")
+        return self.path / prefix / os.path.basename(name)
+
+    def keys(self, prefix: str = "") -> list[str]:
+        return sorted(prefix + p.name for p in (self.path / prefix).glob("*.json"))
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def read(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def write(self, key: str, contents: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(contents)
+
+    def remove(self, key: str) -> None:
+        self._path(key).unlink()
+
+
+class BundleScenarioStore(ScenarioStore):
+    """Read-only scenarios served from a packed, memory-mapped bundle.
+
+    The bundle is a fixed header, a JSON index of ``{key: [offset, length]}``
+    and the raw objects, laid out like a versioned store. Only the index is
+    parsed up front; objects are sliced out of the mapping on demand.
+    """
+
+    read_only = True
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{self.path} is not a scenario bundle")
+        index_start = _HEADER.size
+        self._data_start = index_start + index_length
+        self._index = json.loads(self._mmap[index_start:self._data_start])
+
+    def keys(self, prefix: str = "") -> list[str]:
+        return [key for key in self._index if key.startswith(prefix) and "/" not in key[len(prefix):]]
+
+    def exists(self, key: str) -> bool:
+        return key in self._index
+
+    def read(self, key: str) -> bytes:
+        offset, length = self._index[key]
+        start = self._data_start + offset
+        return self._mmap[start:start + length]
+
+
+def pack_scenarios(source: ScenarioStore | str | Path, bundle_path: str | Path) -> int:
+    """Write the current scenarios in ``source`` to a bundle and return the count."""
+    if not isinstance(source, ScenarioStore):
+        source = DirectoryScenarioStore(source)
+
+    packed = MemoryScenarioStore()
+    for filename, version, data in source.list_scenarios():
+        contents = source.read(f"{VERSIONS}{version}.json") if version else source.read(filename)
+        packed.put_scenario(filename, contents)
+
+    index = {}
+    offset = 0
+    for key, contents in packed.scenarios.items():
+        index[key] = [offset, len(contents)]
+        offset += len(contents)
+
+    index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    with open(bundle_path, "wb") as f:
+        f.write(_HEADER.pack(BUNDLE_MAGIC, len(index_bytes)))
+        f.write(index_bytes)
+        for contents in packed.scenarios.values():
+            f.write(contents)
+    return len(packed.keys(ALIASES))
+
+
+@lru_cache(maxsize=1)
+def get_scenario_store() -> ScenarioStore:
+    """Return the scenario store selected by ``SCENARIO_STORE``."""
+    backend = os.environ.get("SCENARIO_STORE", "s3").lower()
+    if backend == "s3":
+        return S3ScenarioStore(os.environ.get("SCENARIO_BUCKET", DEFAULT_BUCKET))
+    if backend == "file":
+        path = Path(os.environ.get("SCENARIO_PATH", DEFAULT_PATH))
+        if path.is_dir():
+            return DirectoryScenarioStore(path)
+        return BundleScenarioStore(path)
+    if backend == "memory":
+        return MemoryScenarioStore()
+    raise RuntimeError(f"Unknown SCENARIO_STORE backend: {backend}")
+
+
+if __name__ == "__main__":
+    # python -m services.scenario_store <scenario dir> [bundle path]
+    # python -m services.scenario_store --migrate  (versions legacy files in SCENARIO_STORE)
+    if sys.argv[1:] == ["--migrate"]:
+        count = get_scenario_store().migrate_legacy()
+        print(f"Migrated {count} legacy scenarios")
+    elif len(sys.argv) in (2, 3):
+        out = sys.argv[2] if len(sys.argv) == 3 else DEFAULT_PATH
+        count = pack_scenarios(sys.argv[1], out)
+        print(f"Packed {count} scenarios into {out}")
+    else:
+        sys.exit("usage: python -m services.scenario_store <scenario dir> [bundle path] | --migrate")
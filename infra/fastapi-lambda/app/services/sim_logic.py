@@ -1,9 +1,10 @@
 import json
 from pathlib import Path
 from models.simmodels import SimScenario
+from services.scenario_store import DirectoryScenarioStore
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 
 def load_scenario_from_file(file_name: str) -> SimScenario:
-    file_path = Path(__file__).resolve().parent.parent / "data" / file_name
-    with open(file_path) as f:
-        data = json.load(f)
+    data = json.loads(DirectoryScenarioStore(DATA_DIR).read(file_name))
     return SimScenario(**data)
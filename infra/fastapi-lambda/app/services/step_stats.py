@@ -0,0 +1,230 @@
+import bisect
+
+from sqlalchemy import (
+    BigInteger,
+    Integer,
+    Numeric,
+    case,
+    cast,
+    column,
+    delete,
+    func,
+    or_,
+    select,
+    true,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import JSONB, insert
+
+from db import SessionLocal
+from models.progress_models import (
+    ScenarioStepStat,
+    ScenarioStepTimeBucket,
+    SimulationAnalytics,
+    SimulationProgress,
+    SimulationStepProgress,
+)
+
+# Upper bounds (inclusive) of the time-per-step histogram buckets; the last
+# bucket collects everything slower.
+TIME_BUCKETS_MS = [1_000, 2_000, 5_000, 10_000, 20_000, 30_000, 60_000, 120_000, 300_000]
+REBUILD_LOCK_ID = 0x5354_4154  # advisory lock key serialising rebuilds
+
+
+def time_bucket(time_ms: int | None) -> int | None:
+    if time_ms is None:
+        return None
+    return bisect.bisect_left(TIME_BUCKETS_MS, time_ms)
+
+
+def record_step(db, scenario_id: str, step_index: int, decision: str, time_ms: int | None) -> None:
+    """Add one decision to the counters; the caller commits with the step row."""
+    stat = insert(ScenarioStepStat).values(
+        scenario_id=scenario_id,
+        step_index=step_index,
+        decision=decision,
+        count=1,
+        total_time_ms=time_ms or 0,
+    )
+    db.execute(
+        stat.on_conflict_do_update(
+            index_elements=["scenario_id", "step_index", "decision"],
+            set_={
+                "count": ScenarioStepStat.count + 1,
+                "total_time_ms": ScenarioStepStat.total_time_ms + (time_ms or 0),
+            },
+        )
+    )
+
+    bucket = time_bucket(time_ms)
+    if bucket is None:
+        return
+    histogram = insert(ScenarioStepTimeBucket).values(
+        scenario_id=scenario_id, step_index=step_index, bucket=bucket, count=1
+    )
+    db.execute(
+        histogram.on_conflict_do_update(
+            index_elements=["scenario_id", "step_index", "bucket"],
+            set_={"count": ScenarioStepTimeBucket.count + 1},
+        )
+    )
+
+
+def _steps(scenario_id: str | None):
+    """Select (scenario_id, step_index, decision, time_ms) for every recorded step."""
+    live = (
+        select(
+            SimulationProgress.scenario_id,
+            SimulationStepProgress.step_index,
+            SimulationStepProgress.decision,
+            cast(SimulationStepProgress.time_ms, BigInteger).label("time_ms"),
+        )
+        .join_from(
+            SimulationStepProgress,
+            SimulationProgress,
+            SimulationProgress.sim_uuid == SimulationStepProgress.sim_uuid,
+        )
+    )
+    # completed attempts have been folded into simulation_analytics
+    step = func.jsonb_array_elements(SimulationAnalytics.timeline["steps"]).table_valued(
+        column("value", JSONB)
+    )
+    compacted = (
+        select(
+            SimulationAnalytics.scenario_id,
+            cast(step.c.value["step_index"].astext, Integer).label("step_index"),
+            step.c.value["decision"].astext.label("decision"),
+            cast(cast(step.c.value["timeMs"].astext, Numeric), BigInteger).label("time_ms"),
+        )
+        .select_from(SimulationAnalytics)
+        .join(step, true())
+    )
+    if scenario_id:
+        live = live.where(SimulationProgress.scenario_id == scenario_id)
+        compacted = compacted.where(SimulationAnalytics.scenario_id == scenario_id)
+    steps = union_all(live, compacted).subquery("steps")
+    return select(steps).where(steps.c.step_index.is_not(None), steps.c.decision.is_not(None)).subquery("counted")
+
+
+def rebuild_step_stats(scenario_id: str | None = None) -> int:
+    """Recompute the counters from stored steps (catch-up job).
+
+    Corrects the counters for ``scenario_id`` (or every scenario) and returns
+    the number of steps counted. Each table is fixed with a single statement
+    that counts the stored steps, subtracts the counters as of the same
+    snapshot and adds the difference onto the live rows. ``record_step``
+    writes the step and its counters in one transaction, so increments made
+    while the scan runs are kept rather than overwritten, and the scan holds
+    no lock that would block them. PostgreSQL only, like ``record_step``.
+    """
+    db = SessionLocal()
+    try:
+        # rebuilds in other processes would apply the same correction twice
+        db.execute(select(func.pg_advisory_xact_lock(REBUILD_LOCK_ID)))
+        steps = _steps(scenario_id)
+
+        stats = ScenarioStepStat.__table__
+        counted = select(
+            steps.c.scenario_id,
+            steps.c.step_index,
+            steps.c.decision,
+            func.count().label("count"),
+            func.coalesce(func.sum(steps.c.time_ms), 0).label("total_time_ms"),
+        ).group_by(steps.c.scenario_id, steps.c.step_index, steps.c.decision)
+        current = select(
+            stats.c.scenario_id, stats.c.step_index, stats.c.decision, -stats.c.count, -stats.c.total_time_ms
+        )
+        if scenario_id:
+            current = current.where(stats.c.scenario_id == scenario_id)
+        drift = union_all(counted, current).subquery("drift")
+        correction = insert(stats).from_select(
+            ["scenario_id", "step_index", "decision", "count", "total_time_ms"],
+            select(
+                drift.c.scenario_id,
+                drift.c.step_index,
+                drift.c.decision,
+                func.sum(drift.c.count),
+                func.sum(drift.c.total_time_ms),
+            )
+            .group_by(drift.c.scenario_id, drift.c.step_index, drift.c.decision)
+            .having(or_(func.sum(drift.c.count) != 0, func.sum(drift.c.total_time_ms) != 0)),
+        )
+        db.execute(correction.on_conflict_do_update(
+            index_elements=["scenario_id", "step_index", "decision"],
+            set_={
+                "count": stats.c.count + correction.excluded.count,
+                "total_time_ms": stats.c.total_time_ms + correction.excluded.total_time_ms,
+            },
+        ))
+
+        histogram = ScenarioStepTimeBucket.__table__
+        bucket = case(
+            *[(steps.c.time_ms <= bound, index) for index, bound in enumerate(TIME_BUCKETS_MS)],
+            else_=len(TIME_BUCKETS_MS),
+        )
+        counted = (
+            select(steps.c.scenario_id, steps.c.step_index, bucket.label("bucket"), func.count().label("count"))
+            .where(steps.c.time_ms.is_not(None))
+            .group_by(steps.c.scenario_id, steps.c.step_index, bucket)
+        )
+        current = select(histogram.c.scenario_id, histogram.c.step_index, histogram.c.bucket, -histogram.c.count)
+        if scenario_id:
+            current = current.where(histogram.c.scenario_id == scenario_id)
+        drift = union_all(counted, current).subquery("drift")
+        correction = insert(histogram).from_select(
+            ["scenario_id", "step_index", "bucket", "count"],
+            select(drift.c.scenario_id, drift.c.step_index, drift.c.bucket, func.sum(drift.c.count))
+            .group_by(drift.c.scenario_id, drift.c.step_index, drift.c.bucket)
+            .having(func.sum(drift.c.count) != 0),
+        )
+        db.execute(correction.on_conflict_do_update(
+            index_elements=["scenario_id", "step_index", "bucket"],
+            set_={"count": histogram.c.count + correction.excluded.count},
+        ))
+
+        # counters for steps that no longer exist end up at zero
+        db.execute(delete(stats).where(stats.c.count <= 0))
+        db.execute(delete(histogram).where(histogram.c.count <= 0))
+        total = select(func.coalesce(func.sum(stats.c.count), 0))
+        if scenario_id:
+            total = total.where(stats.c.scenario_id == scenario_id)
+        counted = db.execute(total).scalar()
+        db.commit()
+        return counted
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_step_stats(db, scenario_id: str) -> list[dict]:
+    """Return per-step decision counts and time histograms for a scenario."""
+    steps: dict[int, dict] = {}
+
+    def entry(step_index: int) -> dict:
+        if step_index not in steps:
+            steps[step_index] = {
+                "step_index": step_index,
+                "attempts": 0,
+                "decisions": [],
+                "time_histogram": [
+                    {"le_ms": bound, "count": 0} for bound in TIME_BUCKETS_MS + [None]
+                ],
+            }
+        return steps[step_index]
+
+    for stat in db.query(ScenarioStepStat).filter_by(scenario_id=scenario_id):
+        step = entry(stat.step_index)
+        step["attempts"] += stat.count
+        step["decisions"].append({
+            "decision": stat.decision,
+            "count": stat.count,
+            "avg_time_ms": int(stat.total_time_ms / stat.count) if stat.count else None,
+        })
+    for bucket in db.query(ScenarioStepTimeBucket).filter_by(scenario_id=scenario_id):
+        entry(bucket.step_index)["time_histogram"][bucket.bucket]["count"] = bucket.count
+
+    for step in steps.values():
+        step["decisions"].sort(key=lambda d: d["count"], reverse=True)
+    return [steps[i] for i in sorted(steps)]
@@ -0,0 +1,122 @@
+import logging
+
+from sqlalchemy import exists
+from sqlalchemy.exc import SQLAlchemyError
+
+from db import SessionLocal
+from models.progress_models import (
+    SimulationAnalytics,
+    SimulationProgress,
+    SimulationStepProgress,
+)
+
+
+def _step_entry(step: SimulationStepProgress) -> dict:
+    """Serialize a step row in the same shape ``/progress/timeline`` returns."""
+    return {
+        "decision": step.decision,
+        "feedback": step.feedback,
+        "timeMs": step.time_ms,
+        "step_index": step.step_index,
+        "sequence": step.sequence,
+        "timestamp": step.created_at.isoformat() if step.created_at else None,
+    }
+
+
+def _totals(steps: list[dict]) -> dict:
+    """Derive summary figures for a list of timeline entries."""
+    times = [s["timeMs"] for s in steps if s.get("timeMs") is not None]
+    total_time = sum(times)
+    return {
+        "step_count": len(steps),
+        "total_time_ms": total_time,
+        "avg_time_ms": int(total_time / len(times)) if times else None,
+        "max_time_ms": max(times) if times else None,
+    }
+
+
+def compacted_sequence(db, sim_uuid: str) -> int:
+    """Return the highest step sequence already folded into the analytics row."""
+    timeline = (
+        db.query(SimulationAnalytics.timeline)
+        .filter_by(sim_uuid=sim_uuid)
+        .scalar()
+    )
+    steps = (timeline or {}).get("steps", [])
+    return max((s.get("sequence") or i for i, s in enumerate(steps, start=1)), default=0)
+
+
+def compact_simulation(db, sim_uuid: str) -> SimulationAnalytics | None:
+    """Fold the step rows of a completed attempt into one analytics row.
+
+    Step rows are deleted once folded so ``simulation_step_progress`` only
+    holds attempts that are still in flight. Running this again for the same
+    attempt appends any steps recorded since the last compaction. The caller
+    is responsible for committing the session.
+    """
+    progress = db.query(SimulationProgress).filter_by(sim_uuid=sim_uuid).first()
+    if not progress or not progress.completed:
+        return None
+
+    rows = (
+        db.query(SimulationStepProgress)
+        .filter_by(sim_uuid=sim_uuid)
+        .order_by(SimulationStepProgress.sequence)
+        .all()
+    )
+    analytics = db.query(SimulationAnalytics).filter_by(sim_uuid=sim_uuid).first()
+    previous = list(analytics.timeline.get("steps", [])) if analytics and analytics.timeline else []
+    steps = previous + [_step_entry(r) for r in rows]
+
+    if analytics is None:
+        analytics = SimulationAnalytics(
+            sim_uuid=sim_uuid,
+            uid=progress.username,
+            scenario_id=progress.scenario_id,
+            started_at=progress.created_at,
+        )
+        db.add(analytics)
+
+    analytics.score = progress.score
+    # reassign rather than mutate so SQLAlchemy notices the JSON change
+    analytics.timeline = {"steps": steps, "totals": _totals(steps)}
+    if rows and rows[-1].created_at:
+        analytics.ended_at = rows[-1].created_at
+    elif analytics.ended_at is None:
+        analytics.ended_at = progress.created_at
+
+    for row in rows:
+        db.delete(row)
+    return analytics
+
+
+def compact_completed_simulations(limit: int = 100) -> int:
+    """Catch-up sweep compacting completed attempts that still have step rows.
+
+    Returns the number of attempts compacted.
+    """
+    db = SessionLocal()
+    compacted = 0
+    try:
+        pending = (
+            db.query(SimulationProgress.sim_uuid)
+            .filter(SimulationProgress.completed.is_(True))
+            .filter(
+                exists().where(
+                    SimulationStepProgress.sim_uuid == SimulationProgress.sim_uuid
+                )
+            )
+            .limit(limit)
+            .all()
+        )
+        for (sim_uuid,) in pending:
+            try:
+                if compact_simulation(db, sim_uuid) is not None:
+                    db.commit()
+                    compacted += 1
+            except SQLAlchemyError:
+                db.rollback()
+                logging.exception("Error compacting simulation %s", sim_uuid)
+        return compacted
+    finally:
+        db.close()
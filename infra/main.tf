@@ -246,9 +246,13 @@ module "fastapi_lambda" {
   vpc_security_group_ids = [module.lambda_sg.security_group_id]
   memory_size            = var.lambda_memory_size
   timeout                = var.lambda_timeout
+  # caps concurrent instances (and so DB connections) across the whole API
+  reserved_concurrent_executions = var.lambda_reserved_concurrency
 
   environment_variables = {
     STAGE = "prod"
+    SCENARIO_STORE = var.scenario_store
+    PROFILE_BUCKET = "redroomsimbucket"
     DATABASE_URL = format(
       "postgresql://%s:%s@%s/%s",
       var.RDS_USERNAME,
@@ -265,7 +269,7 @@ module "fastapi_lambda" {
       resources = ["arn:aws:secretsmanager:us-east-1:216989113260:secret:rds!db-16eac987-ba6d-4655-9ae6-89bdfaa972ae-q9tHBZ"]
     },
     {
-      actions   = ["s3:GetObject", "s3:PutObject", "s3:DeleteObject"]
+      actions   = ["s3:GetObject", "s3:PutObject", "s3:DeleteObject", "s3:ListBucket"]
       resources = ["arn:aws:s3:::redroomsimbucket", "arn:aws:s3:::redroomsimbucket/*"]
     }
   ]
@@ -298,10 +302,16 @@ module "apigateway" {
     ]
     allow_methods = ["GET", "POST", "OPTIONS", "DELETE"]
     allow_headers = ["Content-Type", "Authorization"]
-    expose_headers = []
+    expose_headers = ["X-Scenario-Version", "Retry-After"]
     max_age = 3600
   }
 
+  # shared rate limit; in-process admission control only sees one instance
+  default_route_settings = {
+    throttling_burst_limit = var.api_throttling_burst_limit
+    throttling_rate_limit  = var.api_throttling_rate_limit
+  }
+
 }
 
 resource "aws_apigatewayv2_domain_name" "custom" {
@@ -80,6 +80,30 @@ variable "lambda_timeout" {
   type        = number
 }
 
+variable "lambda_reserved_concurrency" {
+  description = "Maximum concurrent backend Lambda instances; keep it under the RDS connection limit"
+  type        = number
+  default     = 40
+}
+
+variable "api_throttling_burst_limit" {
+  description = "API Gateway burst limit shared by all routes"
+  type        = number
+  default     = 100
+}
+
+variable "api_throttling_rate_limit" {
+  description = "API Gateway steady-state requests per second shared by all routes"
+  type        = number
+  default     = 50
+}
+
+variable "scenario_store" {
+  description = "Scenario backend for the Lambda: s3, or file to serve the bundle packed by CI"
+  type        = string
+  default     = "s3"
+}
+
 variable "frontend_bucket_name" {
   description = "S3 bucket name for frontend static files"
   type        = string